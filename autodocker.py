@@ -1,21 +1,64 @@
 import os
 import sys
 import argparse
-from threading import Thread, Lock
+import hashlib
+import subprocess
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 from managers.print_manager import PrintManager
 from managers.progress_manager import ProgressManager
 from managers.log_manager import LogManager
 from managers.docker_manager import DockerManager
 from managers.container_manager import ContainerManager
+from managers.build_pool import BuildPool, SharedBuild
 
 from utils.config import AutoDockerConfig
-from utils.docker_utils import get_container_name, get_image_name
 from utils.platform_utils import can_build_platform
+from utils.git_utils import prepare_project_source
 
-from dockerfile.generator import create_dockerfile
+from dockerfile.generator import render_dockerfile, write_dockerfile, get_platform_section, get_project_section
 
-def docker_worker(dockerfile_path, image_name, container_name, status, status_lock, print_manager, project_info, progress_manager, debug=False, verbose=False, keepfailed=False, ssh_config=None):
+# Default cap on concurrent builds; past a handful of parallel builds the
+# Docker daemon, not the host, becomes the bottleneck
+DEFAULT_MAX_PARALLEL = 8
+
+# Upper bound on threads writing rendered Dockerfiles to disk
+MAX_WRITE_THREADS = 32
+
+def available_cpus():
+    """
+    Get the CPUs this process may run on.
+    
+    Returns:
+        list: Sorted CPU numbers, honouring the CPU affinity mask (taskset,
+            cgroup cpusets) where the platform exposes it
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def partition_cpus(groups):
+    """
+    Split the CPUs this process may use into contiguous groups.
+    
+    Args:
+        groups (int): Number of groups wanted
+    
+    Returns:
+        list: `groups` comma-separated CPU lists usable with --cpuset-cpus;
+            with fewer CPUs than groups, the lists repeat
+    """
+    cpus = available_cpus()
+    groups = max(1, groups)
+    distinct = min(groups, len(cpus))
+    cpusets = [
+        ','.join(map(str, cpus[i * len(cpus) // distinct:(i + 1) * len(cpus) // distinct]))
+        for i in range(distinct)
+    ]
+    return [cpusets[i % distinct] for i in range(groups)]
+
+def docker_worker(dockerfile_path, image_name, container_name, status, print_manager, project_info, docker, shared_build=None):
     """
     Worker function for building and running Docker containers.
     
@@ -23,26 +66,30 @@ def docker_worker(dockerfile_path, image_name, container_name, status, status_lo
         dockerfile_path (str): Path to Dockerfile
         image_name (str): Name for the image
         container_name (str): Name for the container
-        status (dict): Shared status dictionary
-        status_lock (Lock): Lock for status dictionary
+        status (dict): Shared status dictionary, already holding an entry
+            for this container, which only this worker writes to
         print_manager (PrintManager): Print manager for output
         project_info (dict): Project configuration
-        progress_manager (ProgressManager): Progress manager for tracking
-        debug (bool): Enable debug mode
-        verbose (bool): Enable verbose output
-        keepfailed (bool): Keep failed containers
-        ssh_config (dict): SSH configuration
+        docker (DockerManager): Docker manager shared by all workers
+        shared_build (SharedBuild): Build shared with containers whose
+            Dockerfile is identical, or None if the Dockerfile is unique
     """
-    log_manager = LogManager()
-    docker = DockerManager(print_manager, progress_manager, log_manager, debug, verbose, keepfailed)
-    container = ContainerManager(container_name, image_name, dockerfile_path, project_info, status, status_lock)
+    # Every worker only updates its own preallocated entry, so no lock is needed
+    container = ContainerManager(container_name, image_name, dockerfile_path, project_info, status)
     
     try:
         # Record build start
         container.record_build_start()
         
-        # Build image
-        build_success, build_log = docker.build_image(dockerfile_path, image_name, container_name)
+        # Build image, or reuse the image built from an identical Dockerfile
+        if shared_build is None or shared_build.owner == container_name:
+            build_success, build_log = docker.build_image(dockerfile_path, image_name, container_name)
+            if shared_build:
+                shared_build.finish(build_success, build_log)
+        else:
+            build_success, build_log = shared_build.wait()
+            if build_success and shared_build.image_name != image_name:
+                build_success, build_log = docker.tag_image(shared_build.image_name, image_name, container_name)
         
         if not build_success:
             container.record_build_failure(build_log)
@@ -59,17 +106,19 @@ def docker_worker(dockerfile_path, image_name, container_name, status, status_lo
         else:
             print_manager.print(f"\nContainer {container_name} failed. Logs at {run_log}")
             
-    except Exception as e:
+    except (OSError, subprocess.SubprocessError) as e:
         container.record_error(e)
         print_manager.print(f"\nError processing {container_name}: {str(e)}")
     finally:
-        progress_manager.increment()
+        # Never leave containers sharing this build waiting on a failed worker
+        if shared_build and shared_build.owner == container_name and not shared_build.finished:
+            shared_build.finish(False, None)
 
 class BuildManager:
     """
     Manages the build process for Docker containers.
     """
-    def __init__(self, config, print_manager, debug=False, verbose=False, keepfailed=False):
+    def __init__(self, config, print_manager, debug=False, verbose=False, keepfailed=False, max_parallel=None, cache_dir=None, pin_cpus=False, use_sdk=False):
         """
         Initialize build manager.
         
@@ -79,6 +128,16 @@ class BuildManager:
             debug (bool): Enable debug mode
             verbose (bool): Enable verbose output
             keepfailed (bool): Keep failed containers
+            max_parallel (int): Maximum number of concurrent container builds
+                (defaults to the config's max-parallel, then the usable CPU count
+                up to 8 and at most the number of containers;
+                the command line also takes it from $AUTODOCKER_MAX_PARALLEL)
+            cache_dir (str): Directory for the BuildKit layer cache
+                (defaults to the config's build-cache, disabled if unset)
+            pin_cpus (bool): Give concurrently running containers disjoint
+                CPU sets
+            use_sdk (bool): Drive runs and cleanup through the docker SDK
+                (also enabled by the config's docker-sdk)
         """
         self.config = config
         self.print_manager = print_manager
@@ -86,19 +145,36 @@ class BuildManager:
         self.verbose = verbose
         self.keepfailed = keepfailed
         
-        # Initialize status tracking
+        # Layer cache root, holding one cache directory per image
+        self.cache_dir = cache_dir or config.build_cache
+        
+        # Initialize status tracking; each container's entry is written only
+        # by its own worker and read once the pool has finished
         self.status = {}
-        self.status_lock = Lock()
+        
+        # Plan every (container_name, image_name, container_info) to build once
+        buildable_platforms = []
+        self.skipped_platforms = []
+        for platform in config.platforms:
+            if can_build_platform(platform):
+                buildable_platforms.append(platform)
+            else:
+                self.skipped_platforms.append(platform)
+        self.container_specs = list(config.iter_container_specs(buildable_platforms))
         
         # Calculate total containers
-        self.total_containers = sum(
-            len(config.get_platform_cmake_versions(platform))
-            for platform in config.platforms
-            if can_build_platform(platform)
-        )
+        self.total_containers = len(self.container_specs)
+        
+        # Cap the number of containers building/running at once; by default
+        # one per usable CPU, but never more than there are containers
+        if max_parallel is None:
+            max_parallel = config.max_parallel
+        if max_parallel is None:
+            max_parallel = min(len(available_cpus()), DEFAULT_MAX_PARALLEL, self.total_containers or 1)
+        self.max_parallel = max_parallel
         
         # Initialize managers
-        self.progress_manager = ProgressManager(self.total_containers)
+        self.progress_manager = ProgressManager(self.total_containers, self.print_manager.lock)
         self.print_manager.set_progress_manager(self.progress_manager)
         self.log_manager = LogManager()
         self.docker_manager = DockerManager(
@@ -107,79 +183,195 @@ class BuildManager:
             self.log_manager,
             self.debug,
             self.verbose,
-            self.keepfailed
+            self.keepfailed,
+            self.cache_dir,
+            partition_cpus(self.max_parallel) if pin_cpus else None,
+            use_sdk or config.docker_sdk
         )
         
         # Create necessary directories
         os.makedirs('build', exist_ok=True)
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        
+        # Host-side project checkout, set by prepare_source()
+        self.source_dir = None
+        
+        # Project part of every Dockerfile, rendered once per run
+        self.project_section = None
+        
+        # Dockerfiles waiting to be generated, as (render_dockerfile args,
+        # image_name, container_name), and the resulting
+        # (dockerfile_path, image_name, container_name) jobs
+        self.pending_dockerfiles = []
+        self.jobs = []
+        
+        # Builds shared by jobs with identical Dockerfiles, by container name
+        self.shared_builds = {}
         
-        # Keep track of threads
-        self.threads = []
+        # Worker threads running the Docker side of every job
+        self.build_pool = BuildPool(self.max_parallel, self.progress_manager)
     
-    def process_platform(self, platform):
+    def prepare_source(self):
         """
-        Process a single platform configuration.
+        Check out the project on the host so every image can COPY the same tree.
         
-        Args:
-            platform (dict): Platform configuration
+        Images fall back to cloning the project themselves when the project
+        sets host-clone to false or the host cannot fetch the repository.
         """
-        if not can_build_platform(platform):
-            self.print_manager.print(f"Skipping platform {platform['name']} - requirements not met")
+        project = self.config.project
+        if not project.get('git-url') or not project.get('host-clone', True):
             return
         
-        for cmake_version in self.config.get_platform_cmake_versions(platform):
-            container_info = {
-                'platform': platform,
-                'cmake_version': cmake_version,
-                'project': self.config.project,
-                'dependencies': self.config.get_dependencies()
-            }
-            
-            container_name = get_container_name(platform, cmake_version)
-            dockerfile_path = create_dockerfile(
-                container_info,
-                ssh_config=self.config.ssh_config
-            )
-            
-            thread = Thread(
-                target=docker_worker,
-                args=(
-                    dockerfile_path,
-                    get_image_name(platform, cmake_version),
-                    container_name,
-                    self.status,
-                    self.status_lock,
-                    self.print_manager,
-                    self.config.project,
-                    self.progress_manager,
-                    self.debug,
-                    self.verbose,
-                    self.keepfailed,
-                    self.config.ssh_config
+        try:
+            self.source_dir = prepare_project_source(project)
+        except (OSError, subprocess.CalledProcessError) as e:
+            self.print_manager.print(f"Host-side clone failed, cloning inside images instead: {str(e)}")
+    
+    def queue_dockerfiles(self):
+        """
+        Queue the Dockerfile of every planned container.
+        
+        They are written by generate_dockerfiles().
+        """
+        # Everything up to the CMake install is shared by a platform's containers
+        platform_sections = {}
+        
+        for container_name, image_name, container_info in self.container_specs:
+            platform = container_info['platform']
+            platform_section = platform_sections.get(id(platform))
+            if platform_section is None:
+                platform_section = platform_sections[id(platform)] = get_platform_section(
+                    platform,
+                    container_info['dependencies']
                 )
+            container_info['source_dir'] = self.source_dir
+            
+            self.pending_dockerfiles.append((
+                (container_info, self.config.ssh_config, platform_section, self.project_section, container_name),
+                image_name,
+                container_name
+            ))
+    
+    def generate_dockerfiles(self):
+        """
+        Write every queued Dockerfile and record the resulting jobs.
+        
+        Rendering only joins pre-rendered sections, so it runs inline; the
+        rendered Dockerfiles are then written from a thread pool.
+        """
+        rendered = [render_dockerfile(*job_args) for job_args, _, _ in self.pending_dockerfiles]
+        
+        if len(rendered) > 1:
+            with ThreadPoolExecutor(max_workers=min(MAX_WRITE_THREADS, len(rendered))) as executor:
+                list(executor.map(write_dockerfile, *zip(*rendered)))
+        elif rendered:
+            write_dockerfile(*rendered[0])
+        
+        self.jobs = [
+            (dockerfile_path, image_name, container_name)
+            for (dockerfile_path, _), (_, image_name, container_name) in zip(rendered, self.pending_dockerfiles)
+        ]
+        self.pending_dockerfiles = []
+        self.find_shared_builds([data for _, data in rendered])
+    
+    def find_shared_builds(self, dockerfiles):
+        """
+        Group jobs whose Dockerfiles are byte-identical so only one of them builds.
+        
+        The first job of each group owns the build; it is queued before the
+        others, so the pool always starts it before any job waiting on it.
+        
+        Args:
+            dockerfiles (list): Rendered Dockerfile contents, one per job
+        """
+        groups = {}
+        for (_, image_name, container_name), data in zip(self.jobs, dockerfiles):
+            digest = hashlib.sha256(data).digest()
+            groups.setdefault(digest, []).append((image_name, container_name))
+        
+        for group in groups.values():
+            if len(group) > 1:
+                owner_image, owner = group[0]
+                shared_build = SharedBuild(owner, owner_image)
+                for _, container_name in group:
+                    self.shared_builds[container_name] = shared_build
+    
+    def _record_worker_crash(self, job, error):
+        """
+        Record a worker that died on an unexpected exception as an error.
+        
+        The traceback is printed, since such an exception is a bug rather
+        than a Docker failure.
+        
+        Args:
+            job (tuple): docker_worker arguments of the job
+            error (BaseException): Exception the worker raised
+        """
+        dockerfile_path, image_name, container_name = job[:3]
+        ContainerManager(container_name, image_name, dockerfile_path, self.config.project, self.status).record_error(error)
+        self.print_manager.print(
+            f"\nUnexpected error processing {container_name}:\n"
+            + ''.join(traceback.format_exception(type(error), error, error.__traceback__)).rstrip('\n')
+        )
+    
+    def run_jobs(self):
+        """Build and run every generated job on the build pool."""
+        # Remove containers left over from earlier runs in one go
+        self.docker_manager.cleanup_batch([container_name for _, _, container_name in self.jobs])
+        
+        # Create every status entry before any worker starts, so the shared
+        # dict never changes size while workers update their own entries
+        for _, _, container_name in self.jobs:
+            self.status[container_name] = {}
+        
+        self.build_pool.run(docker_worker, [
+            (
+                dockerfile_path,
+                image_name,
+                container_name,
+                self.status,
+                self.print_manager,
+                self.config.project,
+                self.docker_manager,
+                self.shared_builds.get(container_name)
             )
-            self.threads.append(thread)
-            thread.start()
+            for dockerfile_path, image_name, container_name in self.jobs
+        ], self._record_worker_crash)
+        
+        # Sweep up after failed runs once, rather than from every worker
+        self.docker_manager.cleanup_failed()
     
     def process_all_platforms(self):
         """Process all platform configurations."""
         try:
-            # Process each platform
-            for platform in self.config.platforms:
-                self.process_platform(platform)
-                
-            # Wait for all threads to complete
-            for thread in self.threads:
-                thread.join()
+            # Fetch the project once on the host
+            self.prepare_source()
+            self.project_section = get_project_section(
+                self.config.project,
+                self.config.ssh_config,
+                self.source_dir
+            )
+            
+            for platform in self.skipped_platforms:
+                self.print_manager.print(f"Skipping platform {platform['name']} - requirements not met")
+            
+            # Generate every Dockerfile up front, then fan out only the Docker work
+            self.queue_dockerfiles()
+            self.generate_dockerfiles()
+            self.run_jobs()
                 
+            # Every worker has returned by now, so the status is final
+            status = self.status
+            
             # Print final status
             self.print_manager.separator()
             self.print_manager.print("\nBuild Status:")
-            self.print_manager.pprint(self.status)
+            self.print_manager.pprint(status)
             
             # Print failure logs and write failed containers information
-            self.log_manager.print_failure_logs(self.status, self.print_manager)
-            if self.log_manager.write_failed_containers(self.status, self.print_manager):
+            self.log_manager.print_failure_logs(status, self.print_manager)
+            if self.log_manager.write_failed_containers(status, self.print_manager):
                 return 1
                 
             return 0
@@ -188,11 +380,6 @@ class BuildManager:
             self.print_manager.print(f"Error: {str(e)}")
             return 1
         finally:
-            # Clean up threads
-            for thread in self.threads:
-                if thread.is_alive():
-                    thread.join(timeout=1)
-            
             # Clean up progress manager
             if hasattr(self, 'progress_manager'):
                 self.progress_manager.close()
@@ -201,6 +388,27 @@ class BuildManager:
             if hasattr(self, 'print_manager'):
                 self.print_manager.stop()
 
+def positive_int(value):
+    """
+    Parse a command line value that must be a whole number of at least 1.
+    
+    Args:
+        value (str): Value given on the command line or by the environment
+        
+    Returns:
+        int: Parsed value
+        
+    Raises:
+        argparse.ArgumentTypeError: If the value is not an integer of at least 1
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
 def main():
     """
     Main function that orchestrates the Docker build process.
@@ -213,6 +421,15 @@ def main():
     parser.add_argument('-v', '--verbose', help='Enable verbose output', action='store_true')
     parser.add_argument('-d', '--debug', help='Enable debug mode', action='store_true')
     parser.add_argument('-k', '--keepfailed', help='Keep failed containers', action='store_true')
+    parser.add_argument(
+        '-j', '--parallel',
+        help='Maximum number of containers to build concurrently (default: $AUTODOCKER_MAX_PARALLEL)',
+        type=positive_int,
+        default=os.environ.get('AUTODOCKER_MAX_PARALLEL')
+    )
+    parser.add_argument('-c', '--cache-dir', help='Directory for the BuildKit layer cache (e.g. build/.buildcache)')
+    parser.add_argument('--pin-cpus', help='Run concurrent containers on disjoint CPU sets', action='store_true')
+    parser.add_argument('--docker-sdk', help='Run and clean up containers through the docker Python SDK', action='store_true')
     args = parser.parse_args()
 
     try:
@@ -228,7 +445,11 @@ def main():
             print_manager,
             args.debug,
             args.verbose,
-            args.keepfailed
+            args.keepfailed,
+            args.parallel,
+            args.cache_dir,
+            args.pin_cpus,
+            args.docker_sdk
         )
         
         # Process all platforms
@@ -2,6 +2,7 @@
 
 import os
 import re
+import shlex
 import subprocess
 import sys
 import inquirer
@@ -99,7 +100,7 @@ class ContainerDebugger:
         print(f"Command: {debug_cmd}\n")
 
         try:
-            subprocess.run(debug_cmd, shell=True)
+            subprocess.run(shlex.split(debug_cmd))
         except KeyboardInterrupt:
             print("\nDebug session terminated by user")
         except Exception as e:
@@ -1,5 +1,113 @@
 import os
-from utils.docker_utils import get_container_name
+from functools import lru_cache
+from utils.docker_utils import get_container_name, sanitize_tag
+
+# %-style templates for the fixed-shape helper sections, parsed once at import
+BASE_TEMPLATE = """FROM %s:%s
+    
+%s
+
+# Update system
+RUN %s
+
+# Install requirements
+RUN %s
+"""
+
+CMAKE_TEMPLATE = """# Install CMake %s
+WORKDIR /tmp
+RUN wget %s
+RUN bash cmake-%s-linux-x86_64.sh --skip-license --prefix=/usr/local
+"""
+
+# Dockerfile frontend directive; RUN --mount cache mounts need BuildKit
+DOCKERFILE_SYNTAX = "# syntax=docker/dockerfile:1"
+
+# BuildKit cache mounts per package manager (named by the first word of a
+# platform's update-cmd), with the command that stops the base image from
+# discarding downloaded packages. The mounts live outside the image layers,
+# so rebuilt layers reuse packages downloaded by earlier builds. apt's
+# package lists are deliberately not mounted: they must stay in the update
+# layer for the requirements RUN, and for apt installs in debug sessions,
+# even when that layer comes from the build cache
+PACKAGE_CACHES = {
+    'apt': (
+        ('/var/cache/apt',),
+        "rm -f /etc/apt/apt.conf.d/docker-clean && "
+        "echo 'Binary::apt::APT::Keep-Downloaded-Packages \"true\";' > /etc/apt/apt.conf.d/keep-cache"
+    ),
+    'pacman': (('/var/cache/pacman/pkg',), None),
+    'dnf': (('/var/cache/dnf',), "echo keepcache=True >> /etc/dnf/dnf.conf"),
+    'yum': (('/var/cache/yum',), "echo keepcache=1 >> /etc/yum.conf"),
+}
+PACKAGE_CACHES['apt-get'] = PACKAGE_CACHES['apt']
+
+# Cache mount for pip downloads made by requirements commands
+PIP_CACHE = '/root/.cache/pip'
+
+# Cache mount keeping downloaded CMake installers between builds
+CMAKE_DOWNLOAD_CACHE = '/tmp/cmake-dl'
+
+# Download URL templates used when a dependency's section has no url; only
+# dependencies with one canonical upstream download get a default
+DEFAULT_URL_TEMPLATES = {
+    'cmake': 'https://github.com/Kitware/CMake/releases/download/v{version}/cmake-{version}-linux-x86_64.sh',
+}
+
+def cache_mount(target, cache_id=None):
+    """
+    Format a BuildKit cache mount flag for a RUN instruction.
+    
+    Args:
+        target (str): Directory to mount the cache at
+        cache_id (str): Cache name, defaults to the target directory
+    
+    Returns:
+        str: --mount flag, locked so parallel builds never share a cache mid-write
+    """
+    id_option = f",id={cache_id}" if cache_id else ""
+    return f"--mount=type=cache,target={target}{id_option},sharing=locked"
+
+@lru_cache(maxsize=None)
+def format_url(url_template, version):
+    """
+    Fill a version into a download URL template.
+    
+    Args:
+        url_template (str): URL with a {version} field, as stored in
+            'url_template' by AutoDockerConfig
+        version (str): Version to substitute
+    
+    Returns:
+        str: Download URL for the version
+    """
+    return url_template.format(version=version)
+
+def dependency_url(info, name, version):
+    """
+    Get the download URL of a dependency version.
+    
+    Falls back to the dependency's entry in DEFAULT_URL_TEMPLATES when its
+    section has no url.
+    
+    Args:
+        info (dict): Dependency configuration, as prepared by AutoDockerConfig
+        name (str): Dependency name, for the error message
+        version (str): Version to download
+    
+    Returns:
+        str: Download URL for the version
+    
+    Raises:
+        ValueError: If the dependency has no download url configured and no
+            default
+    """
+    url_template = info.get('url_template') if info else None
+    if url_template is None:
+        url_template = DEFAULT_URL_TEMPLATES.get(name)
+    if url_template is None:
+        raise ValueError(f"Installing {name} {version} requires a url in the {name} section")
+    return format_url(url_template, version)
 
 def get_base_setup(platform):
     """
@@ -15,16 +123,13 @@ def get_base_setup(platform):
         str: Dockerfile commands for base system setup
     """
     env_setup = 'ENV DEBIAN_FRONTEND=noninteractive' if platform['image'] == 'ubuntu' else ''
-    return f"""FROM {platform['image']}:{platform['version']}
-    
-{env_setup}
-
-# Update system
-RUN {platform['update-cmd']}
-
-# Install requirements
-RUN {platform['requirements-cmd']}
-"""
+    return BASE_TEMPLATE % (
+        platform['image'],
+        platform['version'],
+        env_setup,
+        platform['update-cmd'],
+        platform['_requirements_cmd']
+    )
 
 def get_cmake_setup(platform, cmake_info, cmake_version):
     """
@@ -33,20 +138,20 @@ def get_cmake_setup(platform, cmake_info, cmake_version):
     Args:
         platform (dict): Platform configuration
         cmake_info (dict): CMake configuration containing:
-            - url (str): Download URL template
+            - url_template (str): Download URL template
         cmake_version (str): CMake version to install
     
     Returns:
         str: Dockerfile commands for CMake installation or empty string if not needed
     """
-    if 'cmake' not in platform.get('depends', []):
+    if 'cmake' not in platform['_depends_set']:
         return ""
     
-    return f"""# Install CMake {cmake_version}
-WORKDIR /tmp
-RUN wget {cmake_info['url'].replace('<version>', cmake_version)}
-RUN bash cmake-{cmake_version}-linux-x86_64.sh --skip-license --prefix=/usr/local
-"""
+    return CMAKE_TEMPLATE % (
+        cmake_version,
+        dependency_url(cmake_info, 'cmake', cmake_version),
+        cmake_version
+    )
 
 def get_qemu_setup(platform, qemu_info):
     """
@@ -55,7 +160,7 @@ def get_qemu_setup(platform, qemu_info):
     Args:
         platform (dict): Platform configuration
         qemu_info (dict): QEMU configuration containing:
-            - url (str): Download URL
+            - url_template (str): Download URL template
             - version (str): QEMU version
             - configure-cmd (str): Configuration command
             - build-cmd (str): Build command
@@ -64,12 +169,12 @@ def get_qemu_setup(platform, qemu_info):
     Returns:
         str: Dockerfile commands for QEMU setup or empty string if not needed
     """
-    if 'qemu' not in platform.get('depends', []):
+    if 'qemu' not in platform['_depends_set']:
         return ""
     
     return f"""# Build and Install QEMU
 WORKDIR /tmp
-RUN wget -4 {qemu_info['url'].replace('<version>', qemu_info['version'])}
+RUN wget -4 {dependency_url(qemu_info, 'qemu', qemu_info['version'])}
 RUN tar xf qemu-{qemu_info['version']}.tar.xz
 WORKDIR /tmp/qemu-{qemu_info['version']}
 RUN {qemu_info['configure-cmd']}
@@ -84,7 +189,7 @@ def get_python_setup(platform, python_info):
     Args:
         platform (dict): Platform configuration
         python_info (dict): Python configuration containing:
-            - url (str): Download URL
+            - url_template (str): Download URL template
             - version (str): Python version
             - configure-cmd (str): Configuration command
             - build-cmd (str): Build command
@@ -93,12 +198,12 @@ def get_python_setup(platform, python_info):
     Returns:
         str: Dockerfile commands for Python setup or empty string if not needed
     """
-    if 'python' not in platform.get('depends', []):
+    if 'python' not in platform['_depends_set']:
         return ""
     
     return f"""# Build and Install Python
 WORKDIR /tmp
-RUN wget {python_info['url'].replace('<version>', python_info['version'])}
+RUN wget {dependency_url(python_info, 'python', python_info['version'])}
 RUN tar xf Python-{python_info['version']}.tar.xz
 WORKDIR /tmp/Python-{python_info['version']}
 RUN {python_info['configure-cmd']}
@@ -106,7 +211,7 @@ RUN {python_info['build-cmd']}
 RUN {python_info['install-cmd']}
 """
 
-def get_project_setup(project_info):
+def get_project_setup(project_info, source_dir=None):
     """
     Generate project build commands for Dockerfile.
     
@@ -118,14 +223,22 @@ def get_project_setup(project_info):
             - build-cmd (str): Build command
             - install-cmd (str): Installation command
             - test-cmd (str): Test command
+        source_dir (str): Host-side checkout to COPY instead of cloning
+            (see utils.git_utils.prepare_project_source)
     
     Returns:
         str: Dockerfile commands for project setup
     """
+    if source_dir:
+        fetch = f"COPY {source_dir} /app"
+    else:
+        fetch = f"""ARG CACHEBUST
+RUN git clone {project_info['git-url']} .
+RUN git checkout {project_info['branch']}"""
+    
     return f"""# Clone and build project
 WORKDIR /app
-RUN git clone {project_info['git-url']} .
-RUN git checkout {project_info['branch']}
+{fetch}
 RUN {project_info['configure-cmd']}
 RUN {project_info['build-cmd']}
 RUN {project_info['install-cmd']}
@@ -169,16 +282,14 @@ def get_ssh_setup(ssh_config):
             - keys (list): List of key files to copy
             - mount-type (str): How to handle keys ("copy" or "volume")
     
-    Returns:
-        list: List of Dockerfile commands for SSH setup
+    Yields:
+        str: Dockerfile commands for SSH setup
     """
     if not ssh_config.get('enabled', False):
-        return []
+        return
 
-    commands = []
-    
     # Create .ssh directory with correct permissions
-    commands.append("RUN mkdir -p /root/.ssh && chmod 700 /root/.ssh")
+    yield "RUN mkdir -p /root/.ssh && chmod 700 /root/.ssh"
 
     # Get the SSH directory path from config
     ssh_dir = ssh_config.get('path', 'ssh')
@@ -186,42 +297,34 @@ def get_ssh_setup(ssh_config):
     # Copy SSH keys and config
     for key in ssh_config.get('keys', []):
         key_name = os.path.basename(key)
-        commands.append(f"COPY {ssh_dir}/{key_name} /root/.ssh/{key_name}")
+        yield f"COPY {ssh_dir}/{key_name} /root/.ssh/{key_name}"
 
     # Set proper permissions for all files
-    commands.append('RUN bash -c "chmod 600 /root/.ssh/*"')
+    yield 'RUN bash -c "chmod 600 /root/.ssh/*"'
     
     # Configure SSH to accept new host keys automatically for github.com
-    commands.append('RUN mkdir -p /etc/ssh/ && echo "StrictHostKeyChecking accept-new" >> /etc/ssh/ssh_config')
+    yield 'RUN mkdir -p /etc/ssh/ && echo "StrictHostKeyChecking accept-new" >> /etc/ssh/ssh_config'
     
     # Fix the IdentityFile path in the SSH config if it exists
-    commands.append('RUN if [ -f "/root/.ssh/config" ]; then sed -i "s|~/.ssh/|/root/.ssh/|g" /root/.ssh/config; fi')
+    yield 'RUN if [ -f "/root/.ssh/config" ]; then sed -i "s|~/.ssh/|/root/.ssh/|g" /root/.ssh/config; fi'
     
     # Add debug command to verify SSH setup
-    commands.append('RUN bash -c "ls -la /root/.ssh/ && if [ -f /root/.ssh/config ]; then cat /root/.ssh/config; fi"')
+    yield 'RUN bash -c "ls -la /root/.ssh/ && if [ -f /root/.ssh/config ]; then cat /root/.ssh/config; fi"'
 
-    return commands
-
-def create_dockerfile(container_info, ssh_config=None):
+def get_platform_section(platform, dependencies):
     """
-    Create a Dockerfile for the given container configuration.
+    Generate the platform-wide part of a Dockerfile.
+    
+    Covers the base image, system update, requirements, Python and QEMU, which
+    are identical for every CMake version built on the platform.
     
     Args:
-        container_info (dict): Container configuration containing:
-            - platform (dict): Platform configuration
-            - cmake_version (str): CMake version or None
-            - project (dict): Project configuration
-            - dependencies (dict): Dependencies configuration
-        ssh_config (dict): SSH configuration
+        platform (dict): Platform configuration
+        dependencies (dict): Dependencies configuration
         
     Returns:
-        str: Path to the created Dockerfile
+        str: Dockerfile commands for the platform
     """
-    platform = container_info['platform']
-    cmake_version = container_info['cmake_version']
-    project = container_info['project']
-    dependencies = container_info['dependencies']
-    
     commands = []
     
     # Base image
@@ -231,53 +334,78 @@ def create_dockerfile(container_info, ssh_config=None):
     commands.append("\n# Set environment variables")
     commands.append("ENV DEBIAN_FRONTEND=noninteractive")
     
+    # Keep package downloads in cache mounts when the package manager is known
+    update_words = platform['update-cmd'].split()
+    cache_dirs, keep_cache_cmd = PACKAGE_CACHES.get(update_words[0] if update_words else None, ((), None))
+    if keep_cache_cmd:
+        commands.append("\n# Keep downloaded packages for the build cache")
+        commands.append(f"RUN {keep_cache_cmd}")
+    # Package caches are keyed per base image, so different releases of a
+    # distribution never mix their packages
+    cache_prefix = f"{sanitize_tag(platform['image'])}-{sanitize_tag(platform['version'])}"
+    package_mounts = ''.join(
+        f"{cache_mount(target, cache_prefix + sanitize_tag(target))} " for target in cache_dirs
+    )
+    
     # Update system
     commands.append("\n# Update system")
-    commands.append(f"RUN {platform['update-cmd']}")
+    commands.append(f"RUN {package_mounts}{platform['update-cmd']}")
     
     # Install requirements
     commands.append("\n# Install requirements")
-    commands.append(f"RUN {platform['requirements-cmd']}")
-    
-    # Add CMake if required
-    if cmake_version:
-        commands.append("\n# Install CMake")
-        commands.append(f"RUN wget https://github.com/Kitware/CMake/releases/download/v{cmake_version}/cmake-{cmake_version}-linux-x86_64.sh \\")
-        commands.append("    -q -O /tmp/cmake-install.sh && \\")
-        commands.append("    chmod u+x /tmp/cmake-install.sh && \\")
-        commands.append("    mkdir /opt/cmake && \\")
-        commands.append("    /tmp/cmake-install.sh --skip-license --prefix=/opt/cmake && \\")
-        commands.append("    rm /tmp/cmake-install.sh && \\")
-        commands.append('    ln -s /opt/cmake/bin/* /usr/local/bin/')
+    commands.append(f"RUN {package_mounts}{cache_mount(PIP_CACHE)} {platform['_requirements_cmd']}")
     
     # Add Python if required
-    if 'python' in platform.get('depends', []):
+    if 'python' in platform['_depends_set']:
         python_info = dependencies.get('python')
         if python_info:
             commands.append("\n# Install Python")
             if 'version' in python_info:
-                commands.append(f"RUN wget {python_info['url'].replace('<version>', python_info['version'])} \\")
-                commands.append("    -q -O /tmp/python.tar.xz && \\")
-                commands.append("    tar -xf /tmp/python.tar.xz -C /tmp && \\")
-                commands.append(f"    cd /tmp/Python-{python_info['version']} && \\")
-                commands.append(f"    {python_info['configure-cmd']} && \\")
-                commands.append(f"    {python_info['build-cmd']} && \\")
-                commands.append(f"    {python_info['install-cmd']} && \\")
-                commands.append("    cd / && rm -rf /tmp/python.tar.xz /tmp/Python-*")
+                commands.append(f"""RUN wget {dependency_url(python_info, 'python', python_info['version'])} \\
+    -q -O /tmp/python.tar.xz && \\
+    tar -xf /tmp/python.tar.xz -C /tmp && \\
+    cd /tmp/Python-{python_info['version']} && \\
+    {python_info['configure-cmd']} && \\
+    {python_info['build-cmd']} && \\
+    {python_info['install-cmd']} && \\
+    cd / && rm -rf /tmp/python.tar.xz /tmp/Python-*""")
     
     # Add QEMU if required
-    if 'qemu' in platform.get('depends', []):
+    if 'qemu' in platform['_depends_set']:
         qemu_info = dependencies.get('qemu')
         if qemu_info:
             commands.append("\n# Install QEMU")
-            commands.append(f"RUN wget {qemu_info['url'].replace('<version>', qemu_info['version'])} \\")
-            commands.append("    -q -O /tmp/qemu.tar.xz && \\")
-            commands.append("    tar -xf /tmp/qemu.tar.xz -C /tmp && \\")
-            commands.append(f"    cd /tmp/qemu-{qemu_info['version']} && \\")
-            commands.append(f"    {qemu_info['configure-cmd']} && \\")
-            commands.append(f"    {qemu_info['build-cmd']} && \\")
-            commands.append(f"    {qemu_info['install-cmd']} && \\")
-            commands.append("    cd / && rm -rf /tmp/qemu.tar.xz /tmp/qemu-*")
+            commands.append(f"""RUN wget {dependency_url(qemu_info, 'qemu', qemu_info['version'])} \\
+    -q -O /tmp/qemu.tar.xz && \\
+    tar -xf /tmp/qemu.tar.xz -C /tmp && \\
+    cd /tmp/qemu-{qemu_info['version']} && \\
+    {qemu_info['configure-cmd']} && \\
+    {qemu_info['build-cmd']} && \\
+    {qemu_info['install-cmd']} && \\
+    cd / && rm -rf /tmp/qemu.tar.xz /tmp/qemu-*""")
+    
+    return '\n'.join(commands)
+
+def get_project_section(project, ssh_config=None, source_dir=None):
+    """
+    Generate the project part of a Dockerfile.
+    
+    Covers SSH setup and the project fetch, configure and build, which are
+    identical for every container in a run.
+    
+    Args:
+        project (dict): Project configuration, optionally containing:
+            - dependency-manifests (list): Files, relative to the project
+              root, that determine the project's dependencies
+            - deps-cmd (str): Command fetching those dependencies, run after
+              copying only the manifests
+        ssh_config (dict): SSH configuration
+        source_dir (str): Host-side project checkout to COPY, or None to clone
+        
+    Returns:
+        str: Dockerfile commands for the project
+    """
+    commands = []
     
     # Add SSH setup if required
     if ssh_config and ssh_config.get('enabled', False):
@@ -287,22 +415,145 @@ def create_dockerfile(container_info, ssh_config=None):
     commands.append(f"\n# Create working directory")
     commands.append(f"WORKDIR /workspace")
     
-    # Add project setup
-    if project.get('git-url'):
+    # Add project setup; a host-side checkout is copied in so the layer only
+    # changes with the source itself. Otherwise the clone gets its own layer so
+    # changing the configure or build commands reuses it, and
+    # --build-arg CACHEBUST=<value> forces a re-clone without invalidating the
+    # dependency layers above
+    if source_dir:
+        # Copy the dependency manifests alone first, so the dependency step
+        # is only rerun when one of them changes, not on every source edit
+        manifests = project.get('dependency-manifests')
+        if manifests and project.get('deps-cmd'):
+            commands.append("\n# Fetch project dependencies")
+            for manifest in manifests:
+                commands.append(f"COPY {source_dir}/{manifest} {manifest}")
+            commands.append(f"RUN {project['deps-cmd']}")
+        
+        commands.append("\n# Copy project")
+        commands.append(f"COPY {source_dir} .")
+    elif project.get('git-url'):
         commands.append("\n# Clone project")
-        commands.append(f"RUN git clone {project['git-url']} . && \\")
+        commands.append("ARG CACHEBUST")
         if project.get('branch'):
-            commands.append(f"    git checkout {project['branch']} && \\")
+            commands.append(f"RUN git clone {project['git-url']} . && git checkout {project['branch']}")
+        else:
+            commands.append(f"RUN git clone {project['git-url']} .")
+    
+    if source_dir or project.get('git-url'):
         if project.get('configure-cmd'):
-            commands.append(f"    {project['configure-cmd']} && \\")
+            commands.append("\n# Configure project")
+            commands.append(f"RUN {project['configure-cmd']}")
         if project.get('build-cmd'):
-            commands.append(f"    {project['build-cmd']}")
+            commands.append("\n# Build project")
+            commands.append(f"RUN {project['build-cmd']}")
+    
+    return '\n'.join(commands)
+
+def render_dockerfile(container_info, ssh_config=None, platform_section=None, project_section=None, container_name=None):
+    """
+    Render the Dockerfile for the given container configuration without writing it.
+    
+    Only the CMake install differs between the containers of a platform, so
+    callers generating many containers can pass the platform and project
+    sections in pre-rendered instead of having them rebuilt on every call.
+    
+    Sections are ordered from most to least stable, so a change only rebuilds
+    the layers after it: base image, system update and requirements, Python
+    and QEMU, CMake, SSH keys, dependency manifests, project source, then
+    configure and build as separate layers.
+    
+    Args:
+        container_info (dict): Container configuration containing:
+            - platform (dict): Platform configuration
+            - cmake_version (str): CMake version or None
+            - project (dict): Project configuration
+            - dependencies (dict): Dependencies configuration
+            - source_dir (str): Host-side project checkout to COPY (optional)
+        ssh_config (dict): SSH configuration
+        platform_section (str): Output of get_platform_section for the platform
+        project_section (str): Output of get_project_section for the project
+        container_name (str): Name of the container, derived from the platform
+            and CMake version if not given
+        
+    Returns:
+        tuple: (dockerfile_path, data), the path the Dockerfile belongs at
+            and its UTF-8 encoded contents
+    """
+    platform = container_info['platform']
+    cmake_version = container_info['cmake_version']
+    dependencies = container_info['dependencies']
     
-    # Write Dockerfile
-    container_name = get_container_name(platform, cmake_version)
+    if platform_section is None:
+        platform_section = get_platform_section(platform, dependencies)
+    if project_section is None:
+        project_section = get_project_section(
+            container_info['project'],
+            ssh_config,
+            container_info.get('source_dir')
+        )
+    
+    # Add CMake if required; it varies per container, so it comes after the
+    # platform-wide Python/QEMU layers to keep those shared across versions
+    cmake_block = ""
+    if cmake_version:
+        installer = f"{CMAKE_DOWNLOAD_CACHE}/cmake-{cmake_version}.sh"
+        cmake_block = f"""
+
+# Install CMake, downloading the installer only if it is not cached yet
+RUN {cache_mount(CMAKE_DOWNLOAD_CACHE)} \\
+    if [ ! -f {installer} ]; then \\
+        wget {dependency_url(dependencies.get('cmake'), 'cmake', cmake_version)} \\
+            -q -O {installer}.part && \\
+        mv {installer}.part {installer}; \\
+    fi && \\
+    mkdir /opt/cmake && \\
+    sh {installer} --skip-license --prefix=/opt/cmake && \\
+    ln -s /opt/cmake/bin/* /usr/local/bin/"""
+    
+    if container_name is None:
+        container_name = get_container_name(platform, cmake_version)
     dockerfile_path = f"build/Dockerfile.{container_name}"
     
-    with open(dockerfile_path, 'w') as f:
-        f.write('\n'.join(commands))
+    data = f"{DOCKERFILE_SYNTAX}\n{platform_section}{cmake_block}\n{project_section}".encode('utf-8')
+    return dockerfile_path, data
+
+def write_dockerfile(dockerfile_path, data):
+    """
+    Write a rendered Dockerfile.
+    
+    The data goes to a temporary file that is renamed into place, so a build
+    never sees a half-written Dockerfile.
     
-    return dockerfile_path 
\ No newline at end of file
+    Args:
+        dockerfile_path (str): Path to write the Dockerfile to
+        data (bytes): Dockerfile contents, as returned by render_dockerfile
+        
+    Returns:
+        str: Path to the written Dockerfile
+    """
+    tmp_path = dockerfile_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, dockerfile_path)
+    return dockerfile_path
+
+def create_dockerfile(container_info, ssh_config=None, platform_section=None, project_section=None, container_name=None):
+    """
+    Create a Dockerfile for the given container configuration.
+    
+    Renders it with render_dockerfile and writes it with write_dockerfile.
+    
+    Args:
+        container_info (dict): Container configuration, as for render_dockerfile
+        ssh_config (dict): SSH configuration
+        platform_section (str): Output of get_platform_section for the platform
+        project_section (str): Output of get_project_section for the project
+        container_name (str): Name of the container
+        
+    Returns:
+        str: Path to the created Dockerfile
+    """
+    return write_dockerfile(*render_dockerfile(
+        container_info, ssh_config, platform_section, project_section, container_name
+    ))
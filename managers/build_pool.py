@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Event
+
+class BuildPool:
+    """
+    Runs container jobs on a bounded pool of worker threads.
+
+    Every job spends its time waiting on docker subprocesses, which releases
+    the GIL, so threads are enough to keep several builds in flight.
+    """
+    def __init__(self, max_workers, progress_manager):
+        """
+        Initialize build pool.
+
+        Args:
+            max_workers (int): Maximum number of jobs to run at once
+            progress_manager (ProgressManager): Progress manager advanced as jobs finish
+        """
+        self.max_workers = max_workers
+        self.progress_manager = progress_manager
+
+    def run(self, worker, jobs, on_error):
+        """
+        Run worker(*job) for every job and wait for all of them to finish.
+
+        An exception escaping one job never aborts the others; it is handed
+        to on_error once the job has ended.
+
+        Args:
+            worker (callable): Function executing a single job
+            jobs (list): Argument tuples, one per job
+            on_error (callable): Called as on_error(job, exception) for every
+                job whose worker raised
+        """
+        if not jobs:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+            futures = {executor.submit(worker, *job): job for job in jobs}
+            for future in as_completed(futures):
+                self.progress_manager.increment()
+                error = future.exception()
+                if error is not None:
+                    on_error(futures[future], error)
+
+class SharedBuild:
+    """
+    One image build whose result is reused by containers with an identical Dockerfile.
+    """
+    def __init__(self, owner, image_name):
+        """
+        Initialize shared build.
+
+        Args:
+            owner (str): Name of the container whose worker runs the build
+            image_name (str): Name of the image the owner builds
+        """
+        self.owner = owner
+        self.image_name = image_name
+        self.success = False
+        self.log_file = None
+        self._done = Event()
+
+    @property
+    def finished(self):
+        """Whether the owner's build has finished."""
+        return self._done.is_set()
+
+    def finish(self, success, log_file):
+        """
+        Publish the build result to the waiting containers.
+
+        Args:
+            success (bool): Whether the build succeeded
+            log_file (str): Path to the build log
+        """
+        self.success = success
+        self.log_file = log_file
+        self._done.set()
+
+    def wait(self):
+        """
+        Wait for the owner's build to finish.
+
+        Returns:
+            tuple: (success, log_file_path) of the owner's build
+        """
+        self._done.wait()
+        return self.success, self.log_file
@@ -2,7 +2,7 @@ class ContainerManager:
     """
     Manages container-specific operations and status tracking.
     """
-    def __init__(self, container_name, image_name, dockerfile_path, project_info, status, status_lock):
+    def __init__(self, container_name, image_name, dockerfile_path, project_info, status):
         """
         Initialize container manager.
         
@@ -11,15 +11,15 @@ class ContainerManager:
             image_name (str): Name of the image
             dockerfile_path (str): Path to Dockerfile
             project_info (dict): Project configuration
-            status (dict): Shared status dictionary
-            status_lock (Lock): Lock for status dictionary
+            status (dict): Status dictionary, already holding an entry for the
+                container that only this manager writes to, so no lock is
+                needed
         """
         self.container_name = container_name
         self.image_name = image_name
         self.dockerfile_path = dockerfile_path
         self.project_info = project_info
         self.status = status
-        self.status_lock = status_lock
     
     def update_status(self, **kwargs):
         """
@@ -28,10 +28,7 @@ class ContainerManager:
         Args:
             **kwargs: Key-value pairs to update in status
         """
-        with self.status_lock:
-            if self.container_name not in self.status:
-                self.status[self.container_name] = {}
-            self.status[self.container_name].update(kwargs)
+        self.status[self.container_name].update(kwargs)
     
     def record_build_start(self):
         """Record build start in status."""
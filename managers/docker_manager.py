@@ -1,10 +1,32 @@
+import os
+import re
+import shlex
 import subprocess
+from queue import SimpleQueue
+from threading import Lock
+from managers.print_manager import FAILURE_LOG_TAIL
+from utils.docker_utils import sanitize_tag
+
+# docker SDK module, imported by _connect() only when the SDK is enabled,
+# since it pulls in a full HTTP stack; None while unavailable
+docker = None
+
+# Build step markers: BuildKit plain progress ("#7 [stage-0 3/9] RUN ...")
+# and the legacy builder ("Step 3/9 : RUN ..."), matched at every line start
+BUILD_STEP_PATTERN = re.compile(rb"^(?:#\d+ \[(?:[\w.-]+ )?[ \t]*|Step )(\d+)/(\d+)", re.MULTILINE)
+
+# Bytes read from a build's output pipe at a time
+BUILD_READ_SIZE = 64 * 1024
+
+# Fixed argv prefixes of the cleanup commands; names are appended as-is
+RM_CMD = ('docker', 'rm', '-f')
+RMI_CMD = ('docker', 'rmi', '-f')
 
 class DockerManager:
     """
     Manages Docker operations including building and running containers.
     """
-    def __init__(self, print_manager, progress_manager, log_manager, debug=False, verbose=False, keepfailed=False):
+    def __init__(self, print_manager, progress_manager, log_manager, debug=False, verbose=False, keepfailed=False, cache_dir=None, cpusets=None, use_sdk=False):
         """
         Initialize Docker manager.
         
@@ -15,6 +37,13 @@ class DockerManager:
             debug (bool): Enable debug mode
             verbose (bool): Enable verbose output
             keepfailed (bool): Keep failed containers
+            cache_dir (str): Directory holding a BuildKit layer cache per
+                image, or None to rely on the daemon's own build cache
+            cpusets (list): CPU lists (as for --cpuset-cpus) handed out to
+                running containers, one per container at a time, or None
+                to leave scheduling to the kernel
+            use_sdk (bool): Run, tag, pull and clean up through the docker
+                SDK, connected to the daemon the CLI uses, instead of the CLI
         """
         self.print_manager = print_manager
         self.progress_manager = progress_manager
@@ -22,22 +51,306 @@ class DockerManager:
         self.debug = debug
         self.verbose = verbose
         self.keepfailed = keepfailed
+        self.cache_dir = cache_dir
+        
+        # Free CPU sets; a running container holds one so concurrent runs
+        # never share cores
+        self.cpusets = None
+        if cpusets:
+            self.cpusets = SimpleQueue()
+            for cpuset in cpusets:
+                self.cpusets.put(cpuset)
+        
+        # Always build with BuildKit so unchanged layers are reused
+        self.build_env = {**os.environ, 'DOCKER_BUILDKIT': '1'}
+        
+        # Base images checked or pulled so far, and one lock per base image so
+        # parallel builds sharing a base wait for a single pull instead of racing
+        self.pulled_images = set()
+        self.pull_locks = {}
+        self.pull_locks_lock = Lock()
+        
+        # Containers and images of failed runs, removed together by
+        # cleanup_failed() once all workers are done, so slow image removals
+        # never hold up a worker
+        self.failed_containers = []
+        self.pending_images = []
+        
+        # Talk to the daemon API directly for runs and cleanup when asked to;
+        # builds always use the CLI for BuildKit support
+        self.client = self._connect() if use_sdk else None
+        if use_sdk and not self.client:
+            self.print_manager.print("docker SDK unavailable, using the docker CLI")
+        
+        # Failures that are expected while driving Docker and are reported as
+        # a failed build or run; anything else is a bug and propagates
+        self.docker_errors = (OSError, subprocess.SubprocessError)
+        if self.client:
+            self.docker_errors += (docker.errors.DockerException,)
     
-    def cleanup_existing(self, container_name):
+    @staticmethod
+    def _cli_endpoint():
         """
-        Clean up any existing container with the same name.
+        Get the daemon endpoint the docker CLI talks to.
         
-        Args:
-            container_name (str): Name of the container to clean up
+        Honours DOCKER_HOST, DOCKER_CONTEXT and the CLI's current context,
+        none of which the SDK's from_env() fully resolves on its own.
+        
+        Returns:
+            str: Daemon endpoint, such as unix:///var/run/docker.sock, or
+                None if it cannot be determined
         """
+        if os.environ.get('DOCKER_HOST'):
+            return os.environ['DOCKER_HOST']
         try:
-            subprocess.run(
-                f"docker rm -f {container_name}".split(),
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
+            result = subprocess.run(
+                ['docker', 'context', 'inspect', '--format', '{{.Endpoints.docker.Host}}'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True
             )
-        except:
-            pass
+        except (OSError, subprocess.SubprocessError):
+            return None
+        endpoint = result.stdout.strip()
+        return endpoint if result.returncode == 0 and endpoint else None
+    
+    @classmethod
+    def _connect(cls):
+        """
+        Connect the docker SDK to the daemon the CLI uses, if possible.
+        
+        Builds always go through the CLI, so every other operation must reach
+        the same daemon or it would not find the built images.
+        
+        Returns:
+            docker.DockerClient: Connected client, or None to use the CLI
+        """
+        global docker
+        try:
+            import docker
+        except ImportError:
+            return None
+        endpoint = cls._cli_endpoint()
+        if not endpoint:
+            return None
+        try:
+            client = docker.DockerClient(base_url=endpoint)
+            client.ping()
+            return client
+        except docker.errors.DockerException:
+            return None
+    
+    def cleanup_batch(self, container_names, image_names=()):
+        """
+        Remove containers and images with one docker invocation each, or
+        through the daemon API when the docker SDK is in use.
+        
+        Args:
+            container_names (list): Names of the containers to remove
+            image_names (list): Names of the images to remove
+        """
+        if self.client:
+            for name in container_names:
+                try:
+                    self.client.api.remove_container(name, force=True)
+                except docker.errors.DockerException:
+                    pass
+            for name in image_names:
+                try:
+                    self.client.api.remove_image(name, force=True)
+                except docker.errors.DockerException:
+                    pass
+            return
+        
+        for cmd, names in ((RM_CMD, container_names), (RMI_CMD, image_names)):
+            if not names:
+                continue
+            try:
+                subprocess.run(
+                    (*cmd, *names),
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                )
+            except (OSError, subprocess.SubprocessError):
+                pass
+    
+    def _run_logged(self, cmd, log_file, env=None):
+        """
+        Run a command with its output redirected straight into a log file.
+        
+        The child process writes to the file descriptor directly, so no
+        output passes through Python regardless of verbosity.
+        
+        Args:
+            cmd (list): Command to run
+            log_file (str): Path to log file receiving stdout and stderr
+            env (dict): Environment for the command, or None to inherit
+            
+        Returns:
+            int: Process return code
+        """
+        with open(log_file, 'wb') as f:
+            return subprocess.run(
+                cmd,
+                stdout=f,
+                stderr=subprocess.STDOUT,
+                env=env
+            ).returncode
+    
+    def _run_build_logged(self, cmd, log_file, container_name):
+        """
+        Run a build, copying its output into a log file as it arrives.
+        
+        Output is read from the pipe in large blocks and written to the log
+        as raw bytes. Each block is scanned for build step markers so the
+        progress bar shows which step every container is on while the build
+        is still running.
+        
+        Args:
+            cmd (list): Build command to run
+            log_file (str): Path to log file receiving stdout and stderr
+            container_name (str): Name of the container whose stage is updated
+            
+        Returns:
+            int: Process return code
+        """
+        stage = 'build'
+        with open(log_file, 'wb') as f:
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                env=self.build_env,
+                bufsize=0
+            )
+            fd = process.stdout.fileno()
+            partial = b''
+            with process.stdout:
+                while True:
+                    chunk = os.read(fd, BUILD_READ_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    
+                    # Only scan complete lines; the unfinished last line is
+                    # carried over and scanned with the next block
+                    data = partial + chunk
+                    end = data.rfind(b'\n') + 1
+                    partial = data[end:][-BUILD_READ_SIZE:]
+                    steps = BUILD_STEP_PATTERN.findall(data, 0, end)
+                    if steps:
+                        step = f"build {steps[-1][0].decode()}/{steps[-1][1].decode()}"
+                        if step != stage:
+                            stage = step
+                            self.progress_manager.update_stage(container_name, stage)
+            return process.wait()
+    
+    def _run_container_api(self, image_name, container_name, command, log_file, cpuset=None):
+        """
+        Run a container through the daemon API, streaming its output into a log file.
+        
+        Args:
+            image_name (str): Name of the image to run
+            container_name (str): Name for the container
+            command (list): Command to run, or None for the image default
+            log_file (str): Path to log file receiving stdout and stderr
+            cpuset (str): CPUs to run the container on, or None for any
+            
+        Returns:
+            int: Container exit code
+        """
+        container = self.client.containers.run(
+            image_name,
+            command,
+            name=container_name,
+            detach=True,
+            cpuset_cpus=cpuset
+        )
+        try:
+            with open(log_file, 'wb') as f:
+                for chunk in container.logs(stream=True, follow=True):
+                    f.write(chunk)
+            return container.wait()['StatusCode']
+        finally:
+            container.remove(force=True)
+    
+    @staticmethod
+    def _base_image(dockerfile_path):
+        """
+        Get the base image of a Dockerfile.
+        
+        Args:
+            dockerfile_path (str): Path to Dockerfile
+            
+        Returns:
+            str: Image named by the first FROM instruction, or None if there is none
+        """
+        with open(dockerfile_path, 'r') as f:
+            for line in f:
+                words = line.split()
+                if len(words) > 1 and words[0].upper() == 'FROM':
+                    return words[1]
+        return None
+    
+    def _image_exists(self, image_name):
+        """
+        Check whether an image is present in the local image store.
+        
+        Args:
+            image_name (str): Name of the image
+            
+        Returns:
+            bool: True if the image exists locally
+        """
+        if self.client:
+            try:
+                self.client.api.inspect_image(image_name)
+                return True
+            except docker.errors.DockerException:
+                return False
+        return subprocess.run(
+            ['docker', 'image', 'inspect', image_name],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        ).returncode == 0
+    
+    def pull_base_image(self, base_image, container_name):
+        """
+        Pull a base image that is missing locally, once per run, however many
+        builds start from it.
+        
+        Images already present are never pulled again, so offline runs need
+        no network and a moved tag cannot invalidate the cached layers built
+        on it. Builds sharing a base image wait for the first one's check or
+        pull. A failed pull is not an error: the build then pulls the image
+        itself.
+        
+        Args:
+            base_image (str): Name of the base image
+            container_name (str): Name of the container waiting on the pull
+        """
+        with self.pull_locks_lock:
+            lock = self.pull_locks.setdefault(base_image, Lock())
+        
+        with lock:
+            if base_image in self.pulled_images:
+                return
+            try:
+                if self._image_exists(base_image):
+                    self.pulled_images.add(base_image)
+                    return
+                self.progress_manager.update_stage(container_name, 'pull')
+                if self.client:
+                    self.client.api.pull(base_image)
+                else:
+                    subprocess.run(
+                        ['docker', 'pull', base_image],
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL
+                    )
+            except self.docker_errors:
+                pass
+            self.pulled_images.add(base_image)
     
     def build_image(self, dockerfile_path, image_name, container_name):
         """
@@ -56,36 +369,91 @@ class DockerManager:
         # Get log file path
         _, log_file = self.log_manager.get_log_path(container_name, 'build')
         
-        # Build command
-        cmd = f"docker build -t {image_name} -f {dockerfile_path} ."
+        # Build command, importing and exporting the local layer cache if configured.
+        # Each image gets its own cache directory, so parallel builds never
+        # overwrite each other's cache index
+        if self.cache_dir:
+            image_cache = os.path.join(self.cache_dir, sanitize_tag(image_name))
+            cmd = ['docker', 'buildx', 'build', '--load']
+            if os.path.exists(os.path.join(image_cache, 'index.json')):
+                cmd += ['--cache-from', f"type=local,src={image_cache}"]
+            cmd += ['--cache-to', f"type=local,dest={image_cache},mode=max"]
+        else:
+            # Embed cache metadata in the image and reuse the previous build
+            # of the same tag, so its layers serve as cache even after they
+            # were pruned from the daemon's own build cache. A tag that does
+            # not exist locally yet is left out, since BuildKit would try to
+            # resolve it on Docker Hub instead
+            cmd = ['docker', 'build']
+            if self._image_exists(image_name):
+                cmd += ['--cache-from', image_name]
+            cmd += ['--build-arg', 'BUILDKIT_INLINE_CACHE=1']
+        # Plain progress keeps BuildKit output line-based, even on a terminal,
+        # so the log is readable and build steps can be parsed from it
+        cmd += ['--progress=plain', '-t', image_name, '-f', dockerfile_path, '.']
         if self.verbose:
             self.print_manager.print(f"\nBuilding {container_name}...")
-            self.print_manager.print(f"Command: {cmd}")
+            self.print_manager.print(f"Command: {shlex.join(cmd)}")
         
-        # Run build
+        # Run build, after fetching the base image it shares with other builds
         try:
-            with open(log_file, 'w') as f:
-                result = subprocess.run(
-                    cmd.split(),
-                    stdout=f if not self.verbose else subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True
-                )
+            base_image = self._base_image(dockerfile_path)
+            if base_image:
+                self.pull_base_image(base_image, container_name)
+                self.progress_manager.update_stage(container_name, 'build')
+            returncode = self._run_build_logged(cmd, log_file, container_name)
                 
-            if result.returncode != 0:
+            if returncode != 0:
                 self.print_manager.print(f"\nBuild failed for {container_name}. See {log_file} for details.")
                 if self.verbose:
-                    self.print_manager.print(result.stdout)
+                    self.print_manager.print_file(log_file, tail=FAILURE_LOG_TAIL)
                 return False, log_file
                 
             if self.verbose:
                 self.print_manager.print(f"Build successful for {container_name}")
             return True, log_file
             
-        except Exception as e:
+        except self.docker_errors as e:
             self.print_manager.print(f"\nError building {container_name}: {str(e)}")
             return False, log_file
     
+    def tag_image(self, source_image, image_name, container_name):
+        """
+        Tag an already built image under another name instead of building it.
+        
+        Args:
+            source_image (str): Name of the built image
+            image_name (str): Name to tag it with
+            container_name (str): Name for the container
+            
+        Returns:
+            tuple: (success, log_file_path)
+        """
+        self.progress_manager.update_stage(container_name, 'tag')
+        
+        _, log_file = self.log_manager.get_log_path(container_name, 'build')
+        cmd = ['docker', 'tag', source_image, image_name]
+        if self.verbose:
+            self.print_manager.print(f"\nReusing {source_image} for {container_name} (identical Dockerfile)")
+            self.print_manager.print(f"Command: {shlex.join(cmd)}")
+        
+        try:
+            if self.client:
+                with open(log_file, 'w') as f:
+                    f.write(f"Tagged {source_image} as {image_name} (identical Dockerfile)\n")
+                returncode = 0 if self.client.api.tag(source_image, image_name) else 1
+            else:
+                returncode = self._run_logged(cmd, log_file)
+            
+            if returncode != 0:
+                self.print_manager.print(f"\nTagging failed for {container_name}. See {log_file} for details.")
+                return False, log_file
+            return True, log_file
+            
+        except self.docker_errors as e:
+            self.print_manager.print(f"\nError tagging {container_name}: {str(e)}")
+            return False, log_file
+    
     def run_container(self, image_name, container_name, project_info):
         """
         Run a Docker container.
@@ -100,75 +468,57 @@ class DockerManager:
         """
         self.progress_manager.update_stage(container_name, 'run')
         
-        # Clean up any existing container
-        self.cleanup_existing(container_name)
-        
         # Get log file path
         _, log_file = self.log_manager.get_log_path(container_name, 'run')
         
-        # Run command
-        cmd = f"docker run --rm --name {container_name}"
-        if project_info.get('test-cmd'):
-            cmd = f"{cmd} {image_name} /bin/bash -c '{project_info['test-cmd']}'"
-        else:
-            cmd = f"{cmd} {image_name}"
+        # Run command, passed to docker directly so the test command needs no quoting
+        command = ['/bin/bash', '-c', project_info['test-cmd']] if project_info.get('test-cmd') else []
+        
+        # Hold a CPU set for the whole run when pinning is enabled
+        cpuset = self.cpusets.get() if self.cpusets else None
+        cpuset_args = [f"--cpuset-cpus={cpuset}"] if cpuset else []
+        cmd = ['docker', 'run', '--rm', '--name', container_name, *cpuset_args, image_name, *command]
             
         if self.verbose:
             self.print_manager.print(f"\nRunning {container_name}...")
-            self.print_manager.print(f"Command: {cmd}")
+            self.print_manager.print(f"Command: {shlex.join(cmd)}")
         
         # Run container
         try:
-            with open(log_file, 'w') as f:
-                result = subprocess.run(
-                    cmd,
-                    shell=True,
-                    stdout=f if not self.verbose else subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True
-                )
+            try:
+                if self.client:
+                    returncode = self._run_container_api(image_name, container_name, command or None, log_file, cpuset)
+                else:
+                    returncode = self._run_logged(cmd, log_file)
+            finally:
+                if cpuset:
+                    self.cpusets.put(cpuset)
                 
-            if result.returncode != 0:
+            if returncode != 0:
                 self.print_manager.print(f"\nRun failed for {container_name}. See {log_file} for details.")
                 if self.verbose:
-                    self.print_manager.print(result.stdout)
+                    self.print_manager.print_file(log_file, tail=FAILURE_LOG_TAIL)
                     
                 # Clean up on failure if not keeping failed containers
                 if not self.keepfailed:
-                    self.cleanup_container(container_name, image_name)
+                    self.failed_containers.append(container_name)
+                    self.pending_images.append(image_name)
                 return False, log_file
                 
             if self.verbose:
                 self.print_manager.print(f"Run successful for {container_name}")
             return True, log_file
             
-        except Exception as e:
+        except self.docker_errors as e:
             self.print_manager.print(f"\nError running {container_name}: {str(e)}")
             if not self.keepfailed:
-                self.cleanup_container(container_name, image_name)
+                self.failed_containers.append(container_name)
+                self.pending_images.append(image_name)
             return False, log_file
     
-    def cleanup_container(self, container_name, image_name):
-        """
-        Clean up a container and its image.
-        
-        Args:
-            container_name (str): Name of the container
-            image_name (str): Name of the image
-        """
-        try:
-            # Remove container
-            subprocess.run(
-                f"docker rm -f {container_name}".split(),
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-            
-            # Remove image
-            subprocess.run(
-                f"docker rmi -f {image_name}".split(),
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-        except:
-            pass 
\ No newline at end of file
+    def cleanup_failed(self):
+        """Remove the containers and queued images of every failed run recorded so far."""
+        containers, self.failed_containers = self.failed_containers, []
+        images, self.pending_images = self.pending_images, []
+        # Shared builds can queue the same image for several containers
+        self.cleanup_batch(list(dict.fromkeys(containers)), list(dict.fromkeys(images)))
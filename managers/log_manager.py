@@ -1,6 +1,7 @@
 import os
-from datetime import datetime
-from utils.docker_utils import get_image_name_from_container
+import time
+from threading import Lock
+from managers.print_manager import FAILURE_LOG_TAIL
 
 class LogManager:
     """
@@ -15,6 +16,27 @@ class LogManager:
         """
         self.base_dir = base_dir
         os.makedirs(base_dir, exist_ok=True)
+        
+        # Per-container log directories known to exist, so each path is joined
+        # and created only once; the lock lets parallel workers agree on it
+        self._log_dirs = {}
+        self._log_dirs_lock = Lock()
+        
+        # Last (second, formatted timestamp) pair, reused within the same second
+        self._timestamp = (None, None)
+    
+    def _get_timestamp(self):
+        """
+        Get the current time formatted for log file names.
+        
+        Returns:
+            str: Timestamp as YYYYmmdd_HHMMSS
+        """
+        now = int(time.time())
+        cached = self._timestamp
+        if cached[0] != now:
+            cached = self._timestamp = (now, time.strftime("%Y%m%d_%H%M%S", time.localtime(now)))
+        return cached[1]
     
     def get_log_path(self, container_name, log_type):
         """
@@ -27,11 +49,16 @@ class LogManager:
         Returns:
             tuple: (log_dir, log_file)
         """
-        log_dir = os.path.join(self.base_dir, container_name)
-        os.makedirs(log_dir, exist_ok=True)
+        log_dir = self._log_dirs.get(container_name)
+        if log_dir is None:
+            with self._log_dirs_lock:
+                log_dir = self._log_dirs.get(container_name)
+                if log_dir is None:
+                    log_dir = os.path.join(self.base_dir, container_name)
+                    os.makedirs(log_dir, exist_ok=True)
+                    self._log_dirs[container_name] = log_dir
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_file = os.path.join(log_dir, f"{log_type}_{timestamp}.log")
+        log_file = os.path.join(log_dir, f"{log_type}_{self._get_timestamp()}.log")
         
         return log_dir, log_file
     
@@ -39,21 +66,40 @@ class LogManager:
         """
         Write information about failed containers to a file.
         
+        Every container that did not succeed is listed, whether its build,
+        its run or the worker itself failed. The file is written in one go, in
+        the sectioned format debug_container.py reads.
+        
         Args:
             status (dict): Status dictionary
             print_manager (PrintManager): Print manager for output
+            
+        Returns:
+            bool: True if any container failed
         """
-        failed = [name for name, info in status.items() if info['status'] == 'build_failed']
-        if failed:
-            print_manager.print("\nFailed containers:")
-            with open('failed_containers.txt', 'w') as f:
-                for name in failed:
-                    debug_cmd = f"docker run --rm -it --entrypoint /bin/bash {get_image_name_from_container(name)}"
-                    print_manager.print(f"{name}: {debug_cmd}")
-                    f.write(f"{name}: {debug_cmd}\n")
-            print_manager.print("\nSee failed_containers.txt for debug commands")
-            return True
-        return False
+        # The image name and debug command were recorded when the build started
+        failed = []
+        for name, info in status.items():
+            if info['status'] != 'success':
+                image_name = info.get('image_name', name)
+                debug_cmd = info.get('debug_command') or f"docker run --rm -it --entrypoint /bin/bash {image_name}"
+                failed.append((name, info['status'], image_name, debug_cmd))
+        if not failed:
+            return False
+        
+        separator = '-' * 50
+        report = ''.join(
+            f"Container: {name}\nStatus: {state}\nImage: {image_name}\nDebug Command: {debug_cmd}\n{separator}\n\n"
+            for name, state, image_name, debug_cmd in failed
+        )
+        with open('failed_containers.txt', 'w') as f:
+            f.write(f"Failed Containers Information:\n{'=' * 30}\n\n{report}")
+        
+        summary = ''.join(f"{name}: {debug_cmd}\n" for name, _, _, debug_cmd in failed)
+        print_manager.print(
+            f"\nFailed containers:\n{summary}\nSee failed_containers.txt for debug commands"
+        )
+        return True
     
     def print_failure_logs(self, status, print_manager):
         """
@@ -65,14 +111,16 @@ class LogManager:
         """
         for container, result in status.items():
             if result['status'] != 'success':
-                print_manager.print(f"\nFailure detected for {container}:")
-                print_manager.print(f"Status: {result['status']}")
-                print_manager.print(f"Exit code: {result['code']}")
+                print_manager.print(
+                    f"\nFailure detected for {container}:\n"
+                    f"Status: {result['status']}\n"
+                    f"Exit code: {result['code']}"
+                )
                 
                 if 'build_log' in result:
                     print_manager.print("\nBuild log:")
-                    print_manager.print_file(result['build_log'])
+                    print_manager.print_file(result['build_log'], tail=FAILURE_LOG_TAIL)
                 
                 if 'run_log' in result:
                     print_manager.print("\nRun log:")
-                    print_manager.print_file(result['run_log']) 
\ No newline at end of file
+                    print_manager.print_file(result['run_log'], tail=FAILURE_LOG_TAIL) 
\ No newline at end of file
@@ -1,4 +1,18 @@
+import io
+import json
+import os
+import shutil
+import sys
 from pprint import pprint
+from threading import Lock
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# How much of a log to show when printing a failure
+FAILURE_LOG_TAIL = 64 * 1024
 
 class PrintManager:
     """
@@ -13,6 +27,11 @@ class PrintManager:
         """
         self.progress_manager = progress_manager
         
+        # Held while clearing the bar, printing and redrawing it, so worker
+        # threads printing at once never interleave with each other. Pass it
+        # to ProgressManager so its own repaints take the same lock
+        self.lock = Lock()
+        
     def set_progress_manager(self, progress_manager):
         """
         Set progress manager.
@@ -29,11 +48,12 @@ class PrintManager:
         Args:
             message (str): Message to print
         """
-        if self.progress_manager:
-            self.progress_manager.clear()
-        print(message)
-        if self.progress_manager:
-            self.progress_manager.refresh()
+        with self.lock:
+            if self.progress_manager:
+                self.progress_manager.clear()
+            print(message)
+            if self.progress_manager:
+                self.progress_manager.refresh()
     
     def pprint(self, obj):
         """
@@ -42,26 +62,76 @@ class PrintManager:
         Args:
             obj: Object to print
         """
-        if self.progress_manager:
-            self.progress_manager.clear()
-        pprint(obj)
-        if self.progress_manager:
-            self.progress_manager.refresh()
+        text = self._format(obj)
+        with self.lock:
+            if self.progress_manager:
+                self.progress_manager.clear()
+            print(text)
+            if self.progress_manager:
+                self.progress_manager.refresh()
     
-    def print_file(self, file_path):
+    @staticmethod
+    def _format(obj):
+        """
+        Format an object for pprint().
+        
+        Dicts and lists, such as the build status and configuration, are
+        dumped as indented JSON, which is much faster than the recursive
+        pprint formatter; orjson is used when installed.
+        
+        Args:
+            obj: Object to format
+            
+        Returns:
+            str: Formatted object
+        """
+        if isinstance(obj, (dict, list)):
+            try:
+                if orjson:
+                    return orjson.dumps(
+                        obj,
+                        option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+                        default=str
+                    ).decode()
+                return json.dumps(obj, indent=2, default=str)
+            except (TypeError, ValueError):
+                pass
+        
+        buffer = io.StringIO()
+        pprint(obj, stream=buffer)
+        return buffer.getvalue().rstrip('\n')
+    
+    def print_file(self, file_path, tail=None):
         """
         Print contents of a file.
         
+        The file is streamed to stdout in chunks rather than read into memory,
+        so multi-megabyte build logs are cheap to print.
+        
         Args:
             file_path (str): Path to file
+            tail (int): Only print the last `tail` bytes (starting at a line
+                boundary), or None for the whole file
         """
         try:
-            with open(file_path, 'r') as f:
-                if self.progress_manager:
-                    self.progress_manager.clear()
-                print(f.read())
-                if self.progress_manager:
-                    self.progress_manager.refresh()
+            with open(file_path, 'rb') as f:
+                truncated = False
+                if tail is not None:
+                    size = f.seek(0, os.SEEK_END)
+                    truncated = size > tail
+                    f.seek(max(0, size - tail))
+                    if truncated:
+                        f.readline()
+                
+                with self.lock:
+                    if self.progress_manager:
+                        self.progress_manager.clear()
+                    if truncated:
+                        print(f"... (showing the end of {file_path})")
+                    shutil.copyfileobj(io.TextIOWrapper(f, errors='replace'), sys.stdout)
+                    print()
+                    if self.progress_manager:
+                        self.progress_manager.refresh()
         except Exception as e:
             self.print(f"Error reading file {file_path}: {str(e)}")
     
@@ -1,46 +1,118 @@
-from threading import Lock
-from tqdm import tqdm
+import shutil
+import time
+from itertools import islice
+from threading import Condition, Lock, RLock, Thread
 
 class ProgressManager:
     """
     Manages progress bar for tracking container builds.
     """
-    def __init__(self, total):
+    # Seconds to coalesce stage updates before repainting the description
+    REFRESH_INTERVAL = 0.2
+    
+    # Number of most recently updated containers shown in the description
+    VISIBLE_STAGES = 4
+    
+    # Minimum seconds between tqdm's own repaints when the counter advances
+    MIN_REPAINT_INTERVAL = 0.25
+
+    def __init__(self, total, display_lock=None):
         """
         Initialize progress manager.
-        
+
         Args:
             total (int): Total number of containers to build
+            display_lock (Lock): Lock serializing terminal output, shared with
+                PrintManager so the bar is never drawn in the middle of a
+                printed message; a private lock is used if omitted
         """
-        self.progress = tqdm(total=total, desc="Building containers", unit="container")
+        from tqdm import tqdm
+        
+        self.progress = tqdm(
+            total=total,
+            desc="Building containers",
+            unit="container",
+            mininterval=self.MIN_REPAINT_INTERVAL,
+            miniters=1
+        )
         self.stages = {}
-        self.stage_lock = Lock()
-    
+        self.stage_lock = RLock()
+        self.display_lock = display_lock or Lock()
+
+        # Stage changes only mark the description dirty; a refresher thread
+        # repaints it, so workers never format or draw while holding the lock
+        self._stage_changed = Condition(self.stage_lock)
+        self._dirty = False
+        self._closed = False
+        self._refresher = Thread(target=self._refresh_worker, daemon=True)
+        self._refresher.start()
+
     def update_stage(self, container, stage):
         """
         Update stage for a container.
-        
+
         Args:
             container (str): Container name
             stage (str): Current stage
         """
         with self.stage_lock:
+            # Re-insert so the dict stays ordered by most recent update
+            self.stages.pop(container, None)
             self.stages[container] = stage
-            desc = f"Building containers ({', '.join(f'{k}: {v}' for k, v in self.stages.items())})"
-            self.progress.set_description(desc)
-    
+            # The refresher only waits while the description is clean, so
+            # later updates before its repaint need not wake it again
+            if not self._dirty:
+                self._dirty = True
+                self._stage_changed.notify()
+
+    def _refresh_worker(self):
+        """Repaint the description after stage changes, at most every REFRESH_INTERVAL."""
+        while True:
+            with self.stage_lock:
+                while not self._dirty and not self._closed:
+                    self._stage_changed.wait()
+                if self._closed:
+                    return
+            time.sleep(self.REFRESH_INTERVAL)
+            self._flush_description()
+
+    def _flush_description(self):
+        """Rebuild and draw the stage description if it changed."""
+        with self.stage_lock:
+            if not self._dirty:
+                return
+            stages = list(islice(reversed(self.stages.items()), self.VISIBLE_STAGES))
+            self._dirty = False
+
+        desc = f"Building containers ({', '.join(f'{k}: {v}' for k, v in reversed(stages))})"
+        
+        # Leave room for the bar itself so the line never wraps
+        width = max(shutil.get_terminal_size().columns - 30, 20)
+        if len(desc) > width:
+            desc = desc[:width - 3] + '...'
+        with self.display_lock:
+            self.progress.set_description(desc, refresh=False)
+            self.progress.refresh()
+
     def increment(self):
         """Increment progress counter."""
-        self.progress.update(1)
-    
+        with self.display_lock:
+            self.progress.update(1)
+
     def clear(self):
-        """Clear progress bar."""
+        """Clear progress bar; the caller must hold display_lock."""
         self.progress.clear()
-    
+
     def refresh(self):
-        """Refresh progress bar."""
+        """Refresh progress bar; the caller must hold display_lock."""
         self.progress.refresh()
-    
+
     def close(self):
-        """Close progress bar."""
-        self.progress.close() 
\ No newline at end of file
+        """Stop the refresher, draw the final stages and close progress bar."""
+        with self.stage_lock:
+            self._closed = True
+            self._stage_changed.notify()
+        self._refresher.join()
+        self._flush_description()
+        with self.display_lock:
+            self.progress.close()
@@ -1,4 +1,31 @@
-import yaml
+import os
+from functools import lru_cache
+from utils.docker_utils import get_container_name, get_image_name
+from utils.platform_utils import process_requirements_cmd
+
+@lru_cache(maxsize=None)
+def _yaml():
+    """
+    Import PyYAML on first use, so loads served from the in-process cache never import it.
+    
+    Returns:
+        tuple: (yaml module, safe loader class), preferring the libyaml-backed
+            loader and falling back to the pure-Python one
+    """
+    import yaml
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+    return yaml, SafeLoader
+
+# Parsed configurations keyed by (absolute path, mtime_ns, size), so loading
+# an unchanged file again in the same process skips reading and parsing it,
+# at the cost of a single stat. Entries are shared
+# between AutoDockerConfig instances and are treated as read-only; the only
+# in-place additions (such as url_template) are idempotent.
+_PARSED_CONFIGS = {}
+_PARSED_CONFIGS_MAX = 100
 
 class AutoDockerConfig:
     """
@@ -21,69 +48,153 @@ class AutoDockerConfig:
         self.config_file = config_file
         self.config = self._load_config()
         
+        # Resolve every section once; the properties below return these
+        self._platforms = self.config['platforms']
+        self._project = self.config['project']
+        self._cmake_info = self.config.get('cmake')
+        self._cmake_versions = self._cmake_info.get('versions', []) if self._cmake_info else []
+        self._qemu_info = self.config.get('qemu')
+        self._python_info = self.config.get('python')
+        self._ssh_config = self.config.get('ssh-keys')
+        self._max_parallel = self.config.get('max-parallel')
+        self._build_cache = self.config.get('build-cache')
+        self._docker_sdk = bool(self.config.get('docker-sdk', False))
+        self._dependencies = {
+            'cmake': self._cmake_info,
+            'python': self._python_info,
+            'qemu': self._qemu_info,
+            'aocl-utils': self.config.get('aocl-utils')
+        }
+        
     def _load_config(self):
         """Load and validate configuration file."""
         try:
-            with open(self.config_file, 'r') as f:
-                config = yaml.safe_load(f)
+            stat = os.stat(self.config_file)
+            key = (os.path.abspath(self.config_file), stat.st_mtime_ns, stat.st_size)
+            config = _PARSED_CONFIGS.get(key)
+            if config is None:
+                with open(self.config_file, 'rb') as f:
+                    raw = f.read()
+                yaml, loader = _yaml()
+                try:
+                    config = yaml.load(raw, Loader=loader)
+                except yaml.YAMLError as e:
+                    raise yaml.YAMLError(f"Error parsing YAML file: {e}")
+                
+                if len(_PARSED_CONFIGS) >= _PARSED_CONFIGS_MAX:
+                    _PARSED_CONFIGS.pop(next(iter(_PARSED_CONFIGS)))
+                _PARSED_CONFIGS[key] = config
                 
             # Validate required sections
             required_sections = ['platforms', 'project']
             missing = [s for s in required_sections if s not in config]
             if missing:
                 raise ValueError(f"Missing required sections in config: {', '.join(missing)}")
+            
+            max_parallel = config.get('max-parallel')
+            if max_parallel is not None and (
+                isinstance(max_parallel, bool) or not isinstance(max_parallel, int) or max_parallel < 1
+            ):
+                raise ValueError(f"max-parallel must be an integer of at least 1, got {max_parallel!r}")
+            
+            self._prepare_url_templates(config)
+            self._prepare_platforms(config)
                 
             return config
             
         except FileNotFoundError:
             raise FileNotFoundError(f"Configuration file '{self.config_file}' not found")
-        except yaml.YAMLError as e:
-            raise yaml.YAMLError(f"Error parsing YAML file: {e}")
+    
+    @staticmethod
+    def _prepare_url_templates(config):
+        """
+        Validate dependency download URLs and store them as format templates.
+        
+        Each URL's <version> placeholder is turned into {version} and kept in
+        'url_template', so generators fill it with str.format instead of
+        rescanning the URL on every container. A URL without a placeholder
+        pins a fixed download and is used as-is for every version.
+        
+        Args:
+            config (dict): Parsed configuration
+        """
+        for section in ('cmake', 'qemu', 'python'):
+            info = config.get(section)
+            if not info or 'url' not in info:
+                continue
+            escaped = info['url'].replace('{', '{{').replace('}', '}}')
+            info['url_template'] = escaped.replace('<version>', '{version}')
+    
+    @staticmethod
+    def _prepare_platforms(config):
+        """
+        Precompute per-platform lookups used while generating Dockerfiles.
+        
+        Each platform gets a '_depends_set' frozenset of its depends list, so
+        dependency checks are set lookups instead of list scans, and a
+        '_requirements_cmd' holding its processed requirements command, which
+        only depends on the platform and is shared by all its containers.
+        
+        Args:
+            config (dict): Parsed configuration, updated in place
+        """
+        for platform in config['platforms']:
+            platform['_depends_set'] = frozenset(platform.get('depends', []))
+            platform['_requirements_cmd'] = process_requirements_cmd(platform)
     
     @property
     def platforms(self):
         """Get list of platform configurations."""
-        return self.config['platforms']
+        return self._platforms
     
     @property
     def project(self):
         """Get project configuration."""
-        return self.config['project']
+        return self._project
     
     @property
     def cmake_info(self):
         """Get CMake configuration."""
-        return self.config.get('cmake')
+        return self._cmake_info
     
     @property
     def cmake_versions(self):
         """Get list of CMake versions to build against."""
-        if self.cmake_info:
-            return self.cmake_info.get('versions', [])
-        return []
+        return self._cmake_versions
     
     @property
     def qemu_info(self):
         """Get QEMU configuration."""
-        return self.config.get('qemu')
+        return self._qemu_info
     
     @property
     def python_info(self):
         """Get Python configuration."""
-        return self.config.get('python')
+        return self._python_info
+    
+    @property
+    def max_parallel(self):
+        """Get maximum number of concurrent container builds, if configured."""
+        return self._max_parallel
+    
+    @property
+    def build_cache(self):
+        """Get BuildKit layer cache directory, if configured."""
+        return self._build_cache
+    
+    @property
+    def docker_sdk(self):
+        """Get whether runs and cleanup use the docker SDK instead of the CLI."""
+        return self._docker_sdk
     
     @property
     def ssh_config(self):
         """Get SSH configuration."""
-        return self.config.get('ssh-keys')
+        return self._ssh_config
     
     def get_dependencies(self):
-        """Get all dependency configurations."""
-        return {
-            'python': self.python_info,
-            'qemu': self.qemu_info,
-            'aocl-utils': self.config.get('aocl-utils')
-        }
+        """Get all dependency configurations (shared, do not modify)."""
+        return self._dependencies
     
     def get_platform_cmake_versions(self, platform):
         """
@@ -95,4 +206,33 @@ class AutoDockerConfig:
         Returns:
             list: List of CMake versions or [None] if CMake not required
         """
-        return self.cmake_versions if 'cmake' in platform.get('depends', []) else [None] 
\ No newline at end of file
+        return self.cmake_versions if 'cmake' in platform['_depends_set'] else [None] 
+    
+    def iter_container_specs(self, platforms=None):
+        """
+        Yield the build spec of every platform and CMake version combination.
+        
+        Container and image names are computed here once, so later stages
+        can pass them along instead of re-deriving them.
+        
+        Args:
+            platforms (list): Platforms to expand, defaults to all configured platforms
+        
+        Yields:
+            tuple: (container_name, image_name, container_info), where
+                container_info holds the platform, cmake_version, project
+                and dependencies for create_dockerfile
+        """
+        dependencies = self.get_dependencies()
+        for platform in self.platforms if platforms is None else platforms:
+            for cmake_version in self.get_platform_cmake_versions(platform):
+                yield (
+                    get_container_name(platform, cmake_version),
+                    get_image_name(platform, cmake_version),
+                    {
+                        'platform': platform,
+                        'cmake_version': cmake_version,
+                        'project': self.project,
+                        'dependencies': dependencies
+                    }
+                )
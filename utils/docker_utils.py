@@ -1,3 +1,9 @@
+from functools import lru_cache
+
+# Character substitutions applied by sanitize_tag and sanitize_name in one pass
+_TAG_TABLE = str.maketrans({'/': '-', ':': '-'})
+_NAME_TABLE = str.maketrans({' ': '-'})
+
 def sanitize_tag(tag):
     """
     Sanitize tag name to be compatible with Docker/Podman.
@@ -8,10 +14,16 @@ def sanitize_tag(tag):
     Returns:
         str: Sanitized tag string
     """
-    # Convert tag to string if it's a number
-    tag = str(tag)
-    return tag.replace('/', '-').replace(':', '-')
+    # Convert tag to string if it's a number; caching only on strings keeps
+    # equal numbers such as 3 and 3.0 from sharing a cache entry
+    return _sanitize_tag_str(str(tag))
+
+@lru_cache(maxsize=512)
+def _sanitize_tag_str(tag):
+    """Sanitize a tag that is already a string (cached helper of sanitize_tag)."""
+    return tag.translate(_TAG_TABLE)
 
+@lru_cache(maxsize=512)
 def sanitize_name(name):
     """
     Sanitize a name for use in Docker tags and container names.
@@ -22,7 +34,7 @@ def sanitize_name(name):
     Returns:
         str: Sanitized name
     """
-    return name.lower().replace(' ', '-')
+    return name.lower().translate(_NAME_TABLE)
 
 def get_container_name(platform, cmake_version):
     """
@@ -53,19 +65,3 @@ def get_image_name(platform, cmake_version):
     platform_tag = sanitize_name(platform['version'] if platform['version'] != 'latest' else platform['image'])
     version_suffix = f"-cmake-{cmake_version}" if cmake_version else ""
     return f"{platform_tag}{version_suffix}"
-
-def get_image_name_from_container(container_name):
-    """
-    Extract image name from container name.
-    
-    Args:
-        container_name (str): Container name
-        
-    Returns:
-        str: Image name
-    """
-    parts = container_name.split('-')
-    if 'cmake' in parts:
-        cmake_idx = parts.index('cmake')
-        return '-'.join(parts[:cmake_idx] + parts[cmake_idx:])
-    return container_name 
\ No newline at end of file
@@ -0,0 +1,80 @@
+import os
+import shutil
+import subprocess
+from utils.docker_utils import sanitize_tag
+
+def _git(*args):
+    """
+    Run a git command without ever prompting for credentials.
+
+    Args:
+        *args (str): Arguments passed to git
+
+    Raises:
+        subprocess.CalledProcessError: If git exits with a non-zero status
+    """
+    env = {**os.environ, 'GIT_TERMINAL_PROMPT': '0'}
+    env.setdefault('GIT_SSH_COMMAND', 'ssh -o BatchMode=yes')
+    subprocess.run(
+        ['git', *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+        check=True
+    )
+
+def prepare_project_source(project_info, cache_dir='build'):
+    """
+    Check out the project on the host so images can COPY it instead of cloning.
+
+    A bare mirror of the project is kept in <cache_dir>/repo-cache.git and
+    refreshed with a fetch on every run. Its origin is reset to git-url before
+    each fetch, so changing git-url switches repositories, and a mirror that
+    cannot be fetched (such as one left by an interrupted clone) is removed
+    and cloned again. The requested branch is then checked out into
+    <cache_dir>/src-<branch>, whose origin also follows git-url so commands
+    like `git pull` keep working inside the container.
+    Because Docker hashes COPY sources by content, unchanged source gives a
+    cache hit on the project layers.
+
+    Args:
+        project_info (dict): Project configuration containing:
+            - git-url (str): Project repository URL
+            - branch (str): Git branch to checkout (optional)
+        cache_dir (str): Directory holding the mirror and checkout
+
+    Returns:
+        str: Path to the checked out source tree
+
+    Raises:
+        subprocess.CalledProcessError: If any git operation fails
+    """
+    git_url = project_info['git-url']
+    branch = project_info.get('branch')
+
+    # Clone or refresh the bare mirror
+    mirror = os.path.abspath(os.path.join(cache_dir, 'repo-cache.git'))
+    if os.path.isdir(mirror):
+        try:
+            _git('--git-dir', mirror, 'remote', 'set-url', 'origin', git_url)
+            _git('--git-dir', mirror, 'fetch', '--prune', 'origin')
+        except subprocess.CalledProcessError:
+            shutil.rmtree(mirror)
+    if not os.path.isdir(mirror):
+        _git('clone', '--mirror', git_url, mirror)
+
+    # Check out the branch from the mirror, without touching the network
+    source_dir = os.path.join(cache_dir, f"src-{sanitize_tag(branch or 'HEAD')}")
+    if not os.path.isdir(source_dir):
+        if branch:
+            _git('clone', '--branch', branch, mirror, source_dir)
+        else:
+            _git('clone', mirror, source_dir)
+        _git('-C', source_dir, 'remote', 'set-url', 'origin', git_url)
+    else:
+        _git('-C', source_dir, 'remote', 'set-url', 'origin', git_url)
+        _git('-C', source_dir, 'fetch', mirror, branch or 'HEAD')
+        _git('-C', source_dir, 'reset', '--hard', 'FETCH_HEAD')
+        _git('-C', source_dir, 'clean', '-ffdx')
+
+    return source_dir